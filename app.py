@@ -54,6 +54,12 @@ logger = logging.getLogger(__name__)
 # 初始化调度器
 scheduler = BackgroundScheduler()
 
+# 消息开头的图片URL识别（模块加载时编译一次）
+IMAGE_URL_PATTERN = re.compile(
+    r'^(https?://\S+\.(jpg|jpeg|png|gif|webp))(.*)$',
+    re.IGNORECASE | re.DOTALL
+)
+
 def generate_unique_filename() -> str:
     """
     生成唯一的文件名
@@ -270,8 +276,7 @@ def chat_completions():
         
         # 如果没有使用分隔符，则检查文本内容开头是否为图片URL（向后兼容）
         elif not title_image:
-            url_pattern = r'^(https?://\S+\.(jpg|jpeg|png|gif|webp))(.*)$'
-            match = re.match(url_pattern, last_message, re.IGNORECASE | re.DOTALL)
+            match = IMAGE_URL_PATTERN.match(last_message)
             
             if match:
                 # 如果消息内容以图片URL开头且没有设置title_image，则将其作为logo
@@ -3,23 +3,23 @@
 """
 Advanced image card generator with markdown and emoji support
 """
-import math
+import bisect
 import random
 import os
 import io
-from io import BytesIO  # 显式导入BytesIO
 import requests
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
 import emoji
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Tuple, Optional, Dict
 from datetime import datetime
 import time
 from PIL import UnidentifiedImageError
 import json
 import html
-import gc
 
 # 导入配置
 try:
@@ -46,6 +46,61 @@ EMOJI_CDN_URLS = [
 working_cdn_url = None
 emoji_image_cache = {}
 
+# 单码点emoji集合 - 模块加载时从emoji包数据构建一次，
+# 渲染/测量热路径逐字符判断时用集合成员测试替代emoji.is_emoji调用
+_EMOJI_SINGLE = frozenset(e for e in emoji.EMOJI_DATA if len(e) == 1)
+
+
+def _is_emoji(char: str) -> bool:
+    """单字符emoji快速判断（等价于emoji.is_emoji对单字符的结果）"""
+    return char in _EMOJI_SINGLE
+
+
+# 分词时按这些字符断词（空格及常见中文标点）
+_SPLIT_CHARS = frozenset(' ，。：、！？；')
+
+
+def _has_emoji(text: str) -> bool:
+    """文本中是否包含emoji"""
+    return any(char in _EMOJI_SINGLE for char in text)
+
+
+# CJK码点查找表：一次字节索引代替逐范围比较（BMP以内，64KB）
+_CJK_RANGES = (
+    (0x4E00, 0x9FFF),   # CJK统一表意文字
+    (0x3400, 0x4DBF),   # CJK扩展A
+    (0xF900, 0xFAFF),   # CJK兼容表意文字
+    (0x3040, 0x30FF),   # 日文假名
+    (0x3000, 0x303F),   # CJK符号和标点
+    (0xFF00, 0xFFEF),   # 全角/半角形式
+)
+_CJK_TABLE = bytearray(0x10000)
+for _start, _end in _CJK_RANGES:
+    for _cp in range(_start, _end + 1):
+        _CJK_TABLE[_cp] = 1
+_CJK_TABLE = bytes(_CJK_TABLE)
+
+
+def _is_cjk(char: str) -> bool:
+    """判断是否为按单字换行的CJK字符"""
+    cp = ord(char)
+    return cp < 0x10000 and _CJK_TABLE[cp] == 1
+
+# 模块级HTTP会话 - 连接池复用TCP/TLS连接，免去每次下载的握手开销
+_http_session = requests.Session()
+# 重试在download_image_with_timeout里自己做，适配器层不再重试
+_http_adapter = requests.adapters.HTTPAdapter(
+    pool_connections=8, pool_maxsize=32, max_retries=0)
+_http_session.mount('https://', _http_adapter)
+_http_session.mount('http://', _http_adapter)
+
+# 下载图像的大小上限与请求头（部分站点对无UA请求返回403）
+_MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+_DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; text2card/1.0)',
+    'Accept': 'image/*,*/*;q=0.8',
+}
+
 def codepoint_to_twemoji(codepoint):
     """将Unicode码点转换为Twemoji文件名格式"""
     if '-' in codepoint:
@@ -186,20 +241,21 @@ def get_local_emoji_image(emoji_char: str, size: int = 30) -> Optional[Image.Ima
         return None
 
 # 尝试创建带有文本的emoji图片（作为最后的备选方案）
+@lru_cache(maxsize=256)
 def create_text_emoji(emoji_char: str, size: int = 30) -> Optional[Image.Image]:
-    """创建文本版emoji图片（当无法从网络获取时）"""
+    """创建文本版emoji图片（当无法从网络获取时），同字符同尺寸全局复用"""
     try:
         # 创建透明背景图像
         img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
         draw = ImageDraw.Draw(img)
-        
+
         # 使用默认字体
         font_size = size - 10  # 稍微小一点避免被裁剪
         current_dir = os.path.dirname(os.path.abspath(__file__))
         font_path = os.path.join(current_dir, "msyh.ttc")
-        
+
         try:
-            font = ImageFont.truetype(font_path, font_size)
+            font = _load_font(font_path, font_size)
         except Exception:
             # 如果无法加载字体，使用默认字体
             font = ImageFont.load_default()
@@ -255,6 +311,19 @@ class ProcessedLine:
     style: TextStyle  # 样式信息
     height: int = 0  # 行高
     line_count: int = 1  # 实际占用行数
+    width: int = 0  # 换行时测得的行宽，0表示未测量
+
+
+@lru_cache(maxsize=64)
+def _load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """加载TrueType字体并全局缓存，多个FontManager实例共享解析结果"""
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=4)
+def _font_manager_for(paths_key: Tuple[Tuple[str, str], ...]) -> 'FontManager':
+    """按字体路径缓存FontManager实例，跨渲染复用字体表"""
+    return FontManager(dict(paths_key))
 
 
 class FontManager:
@@ -274,11 +343,11 @@ class FontManager:
         """初始化基础字体"""
         sizes = [30, 35, 40]  # 基础字号
         for size in sizes:
-            self.fonts[f'regular_{size}'] = ImageFont.truetype(self.font_paths['regular'], size)
-            self.fonts[f'bold_{size}'] = ImageFont.truetype(self.font_paths['bold'], size)
+            self.fonts[f'regular_{size}'] = _load_font(self.font_paths['regular'], size)
+            self.fonts[f'bold_{size}'] = _load_font(self.font_paths['bold'], size)
         # emoji字体 - 现在使用Noto Sans字体
         try:
-            self.fonts['emoji_30'] = ImageFont.truetype(self.font_paths['emoji'], 30)
+            self.fonts['emoji_30'] = _load_font(self.font_paths['emoji'], 30)
             print("Emoji字体加载成功")
         except Exception as e:
             print(f"Emoji字体加载失败: {e}")
@@ -295,8 +364,8 @@ class FontManager:
         font_key = f'{base_name}_{style.font_size}'
 
         if font_key not in self.fonts:
-            # 动态创建新字号的字体
-            self.fonts[font_key] = ImageFont.truetype(
+            # 动态创建新字号的字体（底层走全局字体缓存）
+            self.fonts[font_key] = _load_font(
                 self.font_paths['bold' if base_name == 'bold' else 'regular'],
                 style.font_size
             )
@@ -304,11 +373,8 @@ class FontManager:
         return self.fonts[font_key]
 
 
-def get_gradient_styles() -> List[Dict[str, tuple]]:
-    """
-    获取精心设计的背景渐变样式
-    """
-    return [
+# 精心设计的背景渐变样式 - 模块加载时固化为元组，避免每次调用重建字面量
+_GRADIENT_STYLES: Tuple[Dict[str, tuple], ...] = (
         # 现代简约系列 - 增强对比度
         {
             "start_color": (235, 245, 255),  # 浅蓝白
@@ -388,54 +454,67 @@ def get_gradient_styles() -> List[Dict[str, tuple]]:
             "start_color": (200, 245, 235),  # 高级青绿
             "end_color": (235, 235, 255)  # 淡雅紫白
         }
-    ]
+)
 
 
-def create_gradient_background(width: int, height: int) -> Image.Image:
-    """创建渐变背景 - 从左上到右下的对角线渐变，增强效果"""
-    gradient_styles = get_gradient_styles()
-    style = random.choice(gradient_styles)
+def get_gradient_styles() -> Tuple[Dict[str, tuple], ...]:
+    """
+    获取精心设计的背景渐变样式
+    """
+    return _GRADIENT_STYLES
+
+
+@lru_cache(maxsize=64)
+def _build_gradient(width: int, height: int, style_index: int) -> Image.Image:
+    """按 (宽, 高, 样式下标) 预渲染渐变背景并缓存，调用方需copy后再绘制"""
+    style = get_gradient_styles()[style_index]
     start_color = style["start_color"]
     end_color = style["end_color"]
 
-    # 创建基础图像
-    base = Image.new('RGB', (width, height))
-    draw = ImageDraw.Draw(base)
+    # 渐变颜色只随 (x+y) 变化：先算一条长度 w+h 的1-D颜色查找表，
+    # 每个像素退化为一次uint8表查询，而不是逐像素的浮点插值
+    steps = width + height
+    raw_position = np.arange(steps, dtype=np.float32) / steps
 
-    # 计算渐变 - 使用指数曲线增强渐变效果
-    for y in range(height):
-        for x in range(width):
-            # 计算当前位置到左上角的相对距离 (对角线渐变)
-            # 使用非线性渐变使效果更加明显
-            raw_position = (x + y) / (width + height)
-            
-            # 使用幂函数调整渐变曲线，增强对比
-            # pow(raw_position, 0.85) 使渐变在整体上略微倾向于起始色
-            position = pow(raw_position, 0.85)  
-
-            # 为每个颜色通道计算渐变值，并增加轻微的通道差异以提高视觉效果
-            r = int(start_color[0] * (1 - position) + end_color[0] * position)
-            g = int(start_color[1] * (1 - position * 1.05) + end_color[1] * position * 1.05)  # 轻微调整绿色通道
-            b = int(start_color[2] * (1 - position * 0.95) + end_color[2] * position * 0.95)  # 轻微调整蓝色通道
-            
-            # 确保值在合法范围内
-            r = max(0, min(255, r))
-            g = max(0, min(255, g))
-            b = max(0, min(255, b))
+    # 使用幂函数调整渐变曲线，增强对比
+    # pow(raw_position, 0.85) 使渐变在整体上略微倾向于起始色
+    position = np.power(raw_position, 0.85)
 
-            # 绘制像素
-            draw.point((x, y), fill=(r, g, b))
+    # 为每个颜色通道计算渐变值，并增加轻微的通道差异以提高视觉效果
+    lut = np.empty((steps, 3), dtype=np.float32)
+    for idx, factor in ((0, 1.0), (1, 1.05), (2, 0.95)):  # 绿/蓝通道轻微调整
+        pos = position * factor
+        lut[:, idx] = start_color[idx] * (1 - pos) + end_color[idx] * pos
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
 
-    return base
+    # 按 y+x 的对角线下标一次性取色
+    diag_index = np.add.outer(np.arange(height), np.arange(width))
+    pixels = lut[diag_index]
 
+    return Image.fromarray(pixels, 'RGB')
 
-def get_theme_colors() -> Tuple[tuple, str, bool]:
-    """获取主题颜色配置"""
-    current_hour = datetime.now().hour
-    current_minute = datetime.now().minute
+
+def create_gradient_background(width: int, height: int) -> Image.Image:
+    """创建渐变背景 - 从左上到右下的对角线渐变，增强效果"""
+    style_index = random.randrange(len(get_gradient_styles()))
+    # 缓存中的图像是共享的，复制一份交给调用方绘制
+    return _build_gradient(width, height, style_index).copy()
+
+
+# 白天时段出现深色主题的概率
+_DAYTIME_DARK_PROBABILITY = 0.15
+
+
+@lru_cache(maxsize=1)
+def _theme_for_minute(minute_bucket: int) -> Tuple[tuple, str, bool]:
+    """按分钟桶缓存主题选择 - 同一分钟内批量生成的卡片共享同一决策"""
+    now = datetime.fromtimestamp(minute_bucket * 60)
+    current_hour = now.hour
+    current_minute = now.minute
 
     if (current_hour == 8 and current_minute >= 30) or (9 <= current_hour < 19):
-        use_dark = random.random() < 0.15  # 略微增加深色主题出现概率
+        # 用分钟桶播种的独立随机源，保证同一分钟内决策确定
+        use_dark = random.Random(minute_bucket).random() < _DAYTIME_DARK_PROBABILITY  # 略微增加深色主题出现概率
     else:
         use_dark = True
 
@@ -447,46 +526,44 @@ def get_theme_colors() -> Tuple[tuple, str, bool]:
         return ((250, 250, 252, 190), "#2A2A35", False)  # 纯净白 + 深沉灰蓝，增加透明度
 
 
-def create_rounded_rectangle(image: Image.Image, x: int, y: int, w: int, h: int, radius: int, bg_color: tuple):
-    """创建圆角毛玻璃矩形"""
-    # 创建透明背景的矩形
-    rectangle = Image.new('RGBA', (int(w), int(h)), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(rectangle)
+def get_theme_colors() -> Tuple[tuple, str, bool]:
+    """获取主题颜色配置"""
+    return _theme_for_minute(int(time.time()) // 60)
 
-    # 绘制带透明度的圆角矩形
+
+def create_rounded_rectangle(image: Image.Image, x: int, y: int, w: int, h: int, radius: int, bg_color: tuple,
+                             draw: Optional[ImageDraw.ImageDraw] = None):
+    """创建圆角毛玻璃矩形"""
+    # 以RGBA模式直接在背景上绘制带透明度的圆角矩形，
+    # 省去矩形尺寸的临时RGBA图和随后的alpha粘贴
+    if draw is None:
+        draw = ImageDraw.Draw(image, 'RGBA')
     draw.rounded_rectangle(
-        [(0, 0), (int(w), int(h))],
+        [(int(x), int(y)), (int(x + w), int(y + h))],
         radius,
         fill=bg_color  # 使用带透明度的背景色
     )
 
-    # 使用alpha通道混合方式粘贴到背景上
-    image.paste(rectangle, (int(x), int(y)), rectangle)
+
+@lru_cache(maxsize=32)
+def _corner_mask(width: int, height: int, radius: int) -> Image.Image:
+    """生成并缓存圆角蒙版 - 蒙版只取决于尺寸和半径，与图像内容无关"""
+    # 用到圆角矩形的距离场一次性算出整张蒙版，替代圆形裁剪+四次粘贴
+    xx = np.arange(width)[np.newaxis, :]
+    yy = np.arange(height)[:, np.newaxis]
+    # 每个像素到中央"安全区"的水平/垂直距离（安全区内为0）
+    dx = np.maximum(np.maximum(radius - xx, xx - (width - 1 - radius)), 0)
+    dy = np.maximum(np.maximum(radius - yy, yy - (height - 1 - radius)), 0)
+    mask = np.where(dx * dx + dy * dy <= radius * radius, 255, 0).astype(np.uint8)
+    return Image.fromarray(mask, 'L')
 
 
 def round_corner_image(image: Image.Image, radius: int) -> Image.Image:
     """将图片转为圆角"""
-    # 创建一个带有圆角的蒙版
-    circle = Image.new('L', (radius * 2, radius * 2), 0)
-    draw = ImageDraw.Draw(circle)
-    draw.ellipse((0, 0, radius * 2, radius * 2), fill=255)
-
-    # 创建一个完整的蒙版
-    mask = Image.new('L', image.size, 255)
-
-    # 添加四个圆角
-    mask.paste(circle.crop((0, 0, radius, radius)), (0, 0))  # 左上
-    mask.paste(circle.crop((radius, 0, radius * 2, radius)), (image.width - radius, 0))  # 右上
-    mask.paste(circle.crop((0, radius, radius, radius * 2)), (0, image.height - radius))  # 左下
-    mask.paste(circle.crop((radius, radius, radius * 2, radius * 2)),
-               (image.width - radius, image.height - radius))  # 右下
-
-    # 创建一个空白的透明图像
+    # 将原图和缓存的蒙版合并（putalpha不会修改蒙版本身）
     output = Image.new('RGBA', image.size, (0, 0, 0, 0))
-
-    # 将原图和蒙版合并
     output.paste(image, (0, 0))
-    output.putalpha(mask)
+    output.putalpha(_corner_mask(image.width, image.height, radius))
 
     return output
 
@@ -495,10 +572,6 @@ def add_title_image(background: Image.Image, title_image_path: str, rect_x: int,
     """添加标题图片"""
     try:
         with Image.open(title_image_path) as title_img:
-            # 如果图片不是RGBA模式，转换为RGBA
-            if title_img.mode != 'RGBA':
-                title_img = title_img.convert('RGBA')
-
             # 设置图片宽度等于文字区域宽度
             target_width = rect_width - 40  # 左右各留20像素边距
 
@@ -506,6 +579,21 @@ def add_title_image(background: Image.Image, title_image_path: str, rect_x: int,
             aspect_ratio = title_img.height / title_img.width
             target_height = int(target_width * aspect_ratio)
 
+            # JPEG等格式支持按1/2/4/8 DCT比例低分辨率解码，
+            # 反正后面要缩到目标尺寸，先让解码器只解到需要的分辨率
+            title_img.draft('RGB', (int(target_width), max(target_height, 1)))
+
+            # 如果图片不是RGBA模式，转换为RGBA
+            if title_img.mode != 'RGBA':
+                title_img = title_img.convert('RGBA')
+
+            # 大图先用box滤波reduce快速缩小整数倍，再用LANCZOS补齐剩余比例
+            # 重活由O(像素/因子²)的box下采样承担，视觉效果与全程LANCZOS一致
+            factor = max(1, min(title_img.width // int(target_width),
+                                title_img.height // max(target_height, 1)))
+            if factor >= 2:
+                title_img = title_img.reduce(factor)
+
             # 调整图片大小
             resized_img = title_img.resize((int(target_width), target_height), Image.Resampling.LANCZOS)
 
@@ -525,20 +613,66 @@ def add_title_image(background: Image.Image, title_image_path: str, rect_x: int,
         return rect_y + 30
 
 
+# Markdown行级正则 - 模块加载时编译一次，parse_line按行命中
+HR_RE = re.compile(r'^(\-{3,}|\*{3,})$')  # 水平分割线
+STAR_HEADER_RE = re.compile(r'^\*+\s*(.+?)\s*\*+$')  # *标题* / **标题**
+TASK_LIST_RE = re.compile(r'^(\-|\*|\+)\s+\[([ xX])\]\s+(.+)$')  # 任务列表
+UNORDERED_LIST_RE = re.compile(r'^(\*|\-|\+)\s+(.+)$')  # 无序列表
+ORDERED_LIST_RE = re.compile(r'^(\d+)\.[ \t]+(.+)$')  # 有序列表
+NUMBER_CONTENT_RE = re.compile(r'(\d+)\.\s*(.+)')  # 带序号的新闻条目
+LIST_STAR_RE = re.compile(r'^\* (.+)$')  # 星号列表标记
+HEADER_MARK_RE = re.compile(r'^(\*+) (.+?)(\*+)$')  # 星号包裹的标题标记
+
+# 行内格式合并为单个选择分支正则，一趟sub完成所有替换
+# 分支顺序即优先级：链接 > 删除线 > 加粗 > 斜体 > 行内代码
+# 内容用排除字符类而非惰性.+?，匹配线性推进，无回溯爆炸风险
+INLINE_FORMAT_RE = re.compile(
+    r'\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)]+)\)'
+    r'|~~(?P<strike>[^~]+)~~'
+    r'|\*\*(?P<bold>[^*]+)\*\*'
+    r'|\*(?P<italic_star>[^*]+)\*'
+    r'|_(?P<italic_under>[^_]+)_'
+    r'|`(?P<code>[^`]+)`'
+)
+
+
+def _replace_inline(match: re.Match) -> str:
+    """行内格式替换分发：保留内容，去掉标记"""
+    return (match.group('link_text') or match.group('strike')
+            or match.group('bold') or match.group('italic_star')
+            or match.group('italic_under') or match.group('code'))
+
+
+@lru_cache(maxsize=8192)
+def _process_inline_formats(text: str) -> str:
+    """处理行内Markdown格式 - 相同输入直接命中缓存（标点、短语等高频复现）"""
+    # 快速路径：不含任何Markdown元字符的纯文本（多数新闻行）直接返回
+    # 下面的标题/列表/行内格式都至少需要 * _ ` ~ [ 之一才可能命中
+    if not ('*' in text or '_' in text or '`' in text
+            or '~' in text or '[' in text):
+        return text
+
+    # 完全替换所有Markdown格式标记，不保留原始标记
+
+    # 处理标题格式 *一、标题*
+    header_match = HEADER_MARK_RE.match(text)
+    if header_match:
+        return header_match.group(2)  # 只保留标题内容
+
+    # 处理列表项标记 * 列表项
+    list_match = LIST_STAR_RE.match(text)
+    if list_match:
+        return "• " + list_match.group(1)  # 将星号替换为实际的圆点符号
+
+    # 一趟扫描替换所有行内格式：链接/删除线/加粗/斜体/行内代码
+    return INLINE_FORMAT_RE.sub(_replace_inline, text)
+
+
 class MarkdownParser:
     """Markdown解析器"""
 
     def __init__(self):
         self.reset()
-        # 编译常用的正则表达式
-        self.bold_pattern = re.compile(r'\*\*(.+?)\*\*')
-        self.italic_pattern = re.compile(r'\*(.+?)\*|_(.+?)_')
-        self.code_pattern = re.compile(r'`(.+?)`')
-        self.link_pattern = re.compile(r'\[(.+?)\]\((.+?)\)')
-        self.strikethrough_pattern = re.compile(r'~~(.+?)~~')
-        # 添加匹配星号标记的正则表达式
-        self.list_star_pattern = re.compile(r'^\* (.+)$')
-        self.header_pattern = re.compile(r'^(\*+) (.+?)(\*+)$')
 
     def reset(self):
         self.segments = []
@@ -552,7 +686,13 @@ class MarkdownParser:
         self.reset()
         segments = []
         lines = text.splitlines()
-        
+
+        # 预先一遍算好"该行之后是否还有内容"，
+        # 替代循环内对剩余行的反复strip()扫描（原来最坏是O(N²)）
+        has_content_after = [False] * (len(lines) + 1)
+        for j in range(len(lines) - 1, -1, -1):
+            has_content_after[j] = bool(lines[j].strip()) or has_content_after[j + 1]
+
         i = 0
         while i < len(lines):
             line = lines[i].rstrip()
@@ -563,12 +703,13 @@ class MarkdownParser:
                     # 开始代码块
                     self.in_code_block = True
                     code_lang = line[3:].strip()
-                    code_content = []
-                    i += 1
-                    while i < len(lines) and not lines[i].startswith('```'):
-                        code_content.append(lines[i])
-                        i += 1
-                    
+                    # 先定位结束围栏，再整体切片取出代码块，避免逐行append
+                    end = i + 1
+                    while end < len(lines) and not lines[end].startswith('```'):
+                        end += 1
+                    code_content = lines[i + 1:end]
+                    i = end
+
                     if i < len(lines):  # 找到了结束标记
                         code_text = '\n'.join(code_content)
                         style = TextStyle(
@@ -627,12 +768,7 @@ class MarkdownParser:
                 # 空行处理
                 if not line:
                     # 只有当下一行有内容时才添加空行
-                    next_has_content = False
-                    for next_line in lines[i + 1:]:
-                        if next_line.strip():
-                            next_has_content = True
-                            break
-                    if next_has_content:
+                    if has_content_after[i + 1]:
                         style = TextStyle(
                             line_spacing=20 if segments and segments[-1].style.is_title else 15
                         )
@@ -643,15 +779,9 @@ class MarkdownParser:
                     segments.extend(line_segments)
                 
                     # 只在确定有下一行内容时添加空行
-                    if i < len(lines) - 1:
-                        has_next_content = False
-                        for next_line in lines[i + 1:]:
-                            if next_line.strip():
-                                has_next_content = True
-                                break
-                        if has_next_content:
-                            style = line_segments[-1].style
-                            segments.append(TextSegment(text='', style=TextStyle(line_spacing=style.line_spacing)))
+                    if i < len(lines) - 1 and has_content_after[i + 1]:
+                        style = line_segments[-1].style
+                        segments.append(TextSegment(text='', style=TextStyle(line_spacing=style.line_spacing)))
             
             i += 1
 
@@ -682,34 +812,7 @@ class MarkdownParser:
 
     def process_inline_formats(self, text: str) -> str:
         """处理行内Markdown格式"""
-        # 完全替换所有Markdown格式标记，不保留原始标记
-        
-        # 处理标题格式 *一、标题*
-        header_match = self.header_pattern.match(text)
-        if header_match:
-            return header_match.group(2)  # 只保留标题内容
-            
-        # 处理列表项标记 * 列表项
-        list_match = self.list_star_pattern.match(text)
-        if list_match:
-            return "• " + list_match.group(1)  # 将星号替换为实际的圆点符号
-        
-        # 处理链接 [text](url)
-        text = self.link_pattern.sub(r'\1', text)
-        
-        # 处理加粗 **text**
-        text = self.bold_pattern.sub(r'\1', text)
-        
-        # 处理斜体 *text* 或 _text_
-        text = self.italic_pattern.sub(lambda m: m.group(1) or m.group(2), text)
-        
-        # 处理行内代码 `code`
-        text = self.code_pattern.sub(r'\1', text)
-        
-        # 处理删除线 ~~text~~
-        text = self.strikethrough_pattern.sub(r'\1', text)
-        
-        return text
+        return _process_inline_formats(text)
 
     def process_title_marks(self, text: str) -> str:
         """处理标题标记"""
@@ -718,7 +821,9 @@ class MarkdownParser:
 
     def split_number_and_content(self, text: str) -> Tuple[str, str]:
         """分离序号和内容"""
-        match = re.match(r'(\d+)\.\s*(.+)', text)
+        if not text[:1].isdigit():
+            return '', text
+        match = NUMBER_CONTENT_RE.match(text)
         if match:
             return match.group(1), match.group(2)
         return '', text
@@ -736,7 +841,7 @@ class MarkdownParser:
             return [TextSegment(text='', style=TextStyle())]
 
         # 处理水平分割线: --- 或 ***
-        if re.match(r'^(\-{3,}|\*{3,})$', text.strip()):
+        if HR_RE.match(text.strip()):
             style = TextStyle(
                 line_spacing=30,  # 分割线前后增加间距
                 is_horizontal_rule=True
@@ -744,7 +849,10 @@ class MarkdownParser:
             return [TextSegment(text='', style=style)]
 
         # 检查是否匹配标题模式: *标题* 或 **标题**
-        header_match = re.match(r'^\*+\s*(.+?)\s*\*+$', text)
+        # 先用首尾字符判断，绝大多数普通行不必进正则
+        header_match = None
+        if len(text) > 2 and text.startswith('*') and text.endswith('*'):
+            header_match = STAR_HEADER_RE.match(text)
         if header_match:
             title_text = header_match.group(1)
             # 根据星号数量或前缀确定标题级别
@@ -811,7 +919,7 @@ class MarkdownParser:
             return [TextSegment(text=text.strip(), style=style)]
 
         # 处理emoji标题格式
-        if text.strip() and emoji.is_emoji(text[0]):
+        if text.strip() and _is_emoji(text[0]):
             # 移除文本中的加粗标记 **
             content = text.strip()
             content = self.process_inline_formats(content)
@@ -825,8 +933,9 @@ class MarkdownParser:
             )
             return [TextSegment(text=content, style=style)]
 
-        # 处理任务列表项
-        task_match = re.match(r'^(\-|\*|\+)\s+\[([ xX])\]\s+(.+)$', text)
+        # 处理任务列表项（列表类正则只在以列表符开头时才运行）
+        is_list_prefix = text[:1] in ('-', '*', '+')
+        task_match = TASK_LIST_RE.match(text) if is_list_prefix else None
         if task_match:
             marker = task_match.group(1)
             is_checked = task_match.group(2).lower() == 'x'
@@ -844,7 +953,7 @@ class MarkdownParser:
             return [TextSegment(text=task_content, style=style)]
 
         # 增强处理无序列表项
-        list_match = re.match(r'^(\*|\-|\+)\s+(.+)$', text)
+        list_match = UNORDERED_LIST_RE.match(text) if is_list_prefix else None
         if list_match:
             marker = "•"  # 使用实际的圆点符号
             list_content = list_match.group(2).strip()
@@ -859,7 +968,7 @@ class MarkdownParser:
             return [TextSegment(text=f"{marker} {list_content}", style=style)]
 
         # 处理有序列表项 - 增强识别和渲染
-        ordered_list_match = re.match(r'^(\d+)\.[ \t]+(.+)$', text)
+        ordered_list_match = ORDERED_LIST_RE.match(text) if text[:1].isdigit() else None
         if ordered_list_match:
             number = ordered_list_match.group(1)
             content = ordered_list_match.group(2).strip()
@@ -923,14 +1032,45 @@ class MarkdownParser:
         return [TextSegment(text=self.process_inline_formats(text.strip()), style=style)]
 
 
+def _split_emoji_runs(text: str) -> List[Tuple[str, bool]]:
+    """把文本切成 (连续片段, 是否emoji) 的run序列，单次扫描完成"""
+    runs = []
+    if not text:
+        return runs
+    start = 0
+    current_is_emoji = _is_emoji(text[0])
+    for i in range(1, len(text)):
+        is_emo = _is_emoji(text[i])
+        if is_emo != current_is_emoji:
+            runs.append((text[start:i], current_is_emoji))
+            start = i
+            current_is_emoji = is_emo
+    runs.append((text[start:], current_is_emoji))
+    return runs
+
+
 class TextRenderer:
     """文本渲染器"""
 
     def __init__(self, font_manager: FontManager, max_width: int):
         self.font_manager = font_manager
         self.max_width = max_width
+        self.background: Optional[Image.Image] = None  # 渲染目标画布，由generate_image绑定
+        self.emoji_overlay: Optional[Image.Image] = None  # emoji统一绘制层，最后一次性合成
+        self.emoji_pasted = False  # 本次渲染是否粘贴过emoji图片
         self.temp_image = Image.new('RGBA', (2000, 100))
         self.temp_draw = ImageDraw.Draw(self.temp_image)
+        # 单字符度量缓存：同一字体下重复字符免去FreeType调用
+        self._metric_cache: Dict[Tuple[int, str], Tuple[int, int]] = {}
+
+    def paste_emoji(self, emoji_img: Image.Image, pos: Tuple[int, int]):
+        """将emoji图片粘贴到overlay层，避免逐个alpha混合到背景"""
+        try:
+            self.emoji_overlay.paste(emoji_img, pos, emoji_img)
+        except ValueError as e:
+            print(f"粘贴emoji图片失败: {e}, 尝试不使用透明度掩码")
+            self.emoji_overlay.paste(emoji_img, pos)
+        self.emoji_pasted = True
 
     def draw_horizontal_rule(self, draw: ImageDraw.ImageDraw, rect_x: int, current_y: int, rect_width: int, is_dark_theme: bool = False) -> int:
         """绘制水平分割线，返回增加的高度"""
@@ -979,24 +1119,41 @@ class TextRenderer:
         text_x = x + box_size + 10  # 文本距离复选框10像素
         return self.draw_text_with_emoji(draw, (text_x, y), text, font, emoji_font, fill, style) + box_size + 10
 
+    def _char_metrics(self, char: str, font: ImageFont.FreeTypeFont,
+                      emoji_font: Optional[ImageFont.FreeTypeFont] = None) -> Tuple[int, int]:
+        """测量单个字符的宽高并缓存结果"""
+        use_font = emoji_font if (emoji_font and _is_emoji(char)) else font
+        key = (id(use_font), char)
+        cached = self._metric_cache.get(key)
+        if cached is None:
+            # 宽度取字体步进宽度（空格等字符的bbox宽度为0），高度仍取bbox
+            bbox = self.temp_draw.textbbox((0, 0), char, font=use_font)
+            cached = (int(use_font.getlength(char)), bbox[3] - bbox[1])
+            self._metric_cache[key] = cached
+        return cached
+
     def measure_text(self, text: str, font: ImageFont.FreeTypeFont,
                      emoji_font: Optional[ImageFont.FreeTypeFont] = None) -> Tuple[int, int]:
         """测量文本尺寸，考虑emoji"""
+        # 无emoji时整段交给字体测量，避免逐字符循环
+        if emoji_font is None or not _has_emoji(text):
+            bbox = self.temp_draw.textbbox((0, 0), text, font=font)
+            return int(font.getlength(text)), bbox[3] - bbox[1]
+
         total_width = 0
         max_height = 0
 
-        for char in text:
-            if emoji.is_emoji(char) and emoji_font:
-                bbox = self.temp_draw.textbbox((0, 0), char, font=emoji_font)
-                width = bbox[2] - bbox[0]
-                height = bbox[3] - bbox[1]
+        # 混有emoji时按run测量：普通文本整段一次FreeType调用，emoji逐字符
+        for run, is_emo in _split_emoji_runs(text):
+            if not is_emo:
+                bbox = self.temp_draw.textbbox((0, 0), run, font=font)
+                total_width += int(font.getlength(run))
+                max_height = max(max_height, bbox[3] - bbox[1])
             else:
-                bbox = self.temp_draw.textbbox((0, 0), char, font=font)
-                width = bbox[2] - bbox[0]
-                height = bbox[3] - bbox[1]
-
-            total_width += width
-            max_height = max(max_height, height)
+                for char in run:
+                    width, height = self._char_metrics(char, font, emoji_font)
+                    total_width += width
+                    max_height = max(max_height, height)
 
         return total_width, max_height
 
@@ -1036,12 +1193,8 @@ class TextRenderer:
                     fill=quote_bg_color
                 )
 
-        # 获取背景图像对象
-        background = None
-        for obj in [o for o in gc.get_objects() if isinstance(o, Image.Image)]:
-            if obj.mode in ('RGBA', 'RGB') and obj.width > 100:
-                background = obj
-                break
+        # 是否可以用图片方式渲染emoji（overlay由generate_image绑定）
+        background = self.emoji_overlay
 
         # 改进列表项渲染
         if style and style.is_list_item and text.startswith(('•', '-', '+')):
@@ -1057,9 +1210,17 @@ class TextRenderer:
             draw.text((x, y), marker, font=marker_font, fill=fill)
             marker_width = bbox[2] - bbox[0]
             
-            # 绘制内容，缩进10像素
-            for char in content:
-                if emoji.is_emoji(char):
+            # 绘制内容，缩进10像素；按emoji/普通文本的run分段绘制
+            x += marker_width + 10
+            for run, is_emo in _split_emoji_runs(content):
+                if not is_emo:
+                    # 整段普通文本一次绘制
+                    draw.text((x, y), run, font=font, fill=fill)
+                    run_width = sum(self._char_metrics(c, font)[0] for c in run)
+                    x += run_width
+                    total_width += run_width
+                    continue
+                for char in run:
                     # 尝试使用Twemoji图片
                     if background:
                         emoji_img = get_local_emoji_image(char, size=style.font_size)
@@ -1067,65 +1228,52 @@ class TextRenderer:
                             # 确保图像是RGBA模式
                             if emoji_img.mode != 'RGBA':
                                 emoji_img = emoji_img.convert('RGBA')
-                                
+
                             emoji_y = y + (style.font_size - emoji_img.height) // 2
-                            
-                            # 安全粘贴emoji图片
-                            try:
-                                background.paste(emoji_img, (x, emoji_y), emoji_img)
-                            except ValueError as e:
-                                print(f"粘贴emoji图片失败: {e}, 尝试不使用透明度掩码")
-                                background.paste(emoji_img, (x, emoji_y))  # 不使用透明度掩码
-                            
+                            self.paste_emoji(emoji_img, (x, emoji_y))
                             char_width = emoji_img.width
                         else:
                             # 如果图片获取失败，使用普通文本
-                            bbox = draw.textbbox((x + marker_width + 10, y), char, font=emoji_font)
-                            draw.text((x + marker_width + 10, y), char, font=emoji_font, fill=fill)
+                            bbox = draw.textbbox((x, y), char, font=emoji_font)
+                            draw.text((x, y), char, font=emoji_font, fill=fill)
                             char_width = bbox[2] - bbox[0]
                     else:
                         # 如果没有背景，使用普通文本
-                        bbox = draw.textbbox((x + marker_width + 10, y), char, font=emoji_font)
-                        draw.text((x + marker_width + 10, y), char, font=emoji_font, fill=fill)
+                        bbox = draw.textbbox((x, y), char, font=emoji_font)
+                        draw.text((x, y), char, font=emoji_font, fill=fill)
                         char_width = bbox[2] - bbox[0]
-                else:
-                    # 使用常规字体
-                    bbox = draw.textbbox((x + marker_width + 10, y), char, font=font)
-                    draw.text((x + marker_width + 10, y), char, font=font, fill=fill)
-                    char_width = bbox[2] - bbox[0]
-                
-                x += char_width
-                total_width += char_width
-                
+
+                    x += char_width
+                    total_width += char_width
+
             # 添加列表标记和缩进的宽度
             total_width += marker_width + 10
             return total_width
         
-        # 常规文本绘制
-        for char in text:
-            if emoji.is_emoji(char):
+        # 常规文本绘制 - 普通文本按run整段绘制，emoji逐个处理
+        for run, is_emo in _split_emoji_runs(text):
+            if not is_emo:
+                draw.text((x, y), run, font=font, fill=fill)
+                run_width = sum(self._char_metrics(c, font)[0] for c in run)
+                x += run_width
+                total_width += run_width
+                continue
+            for char in run:
                 # 尝试使用Twemoji图片
                 if background:
                     emoji_img = get_local_emoji_image(char, size=font.size)
-                    
+
                     # 如果无法获取图片，尝试创建文本版emoji
                     if emoji_img is None:
                         emoji_img = create_text_emoji(char, size=font.size)
-                            
+
                     if emoji_img:
                         # 确保图像是RGBA模式
                         if emoji_img.mode != 'RGBA':
                             emoji_img = emoji_img.convert('RGBA')
-                        
+
                         emoji_y = y + (font.size - emoji_img.height) // 2
-                        
-                        # 安全粘贴emoji图片
-                        try:
-                            background.paste(emoji_img, (x, emoji_y), emoji_img)
-                        except ValueError as e:
-                            print(f"粘贴emoji图片失败: {e}, 尝试不使用透明度掩码")
-                            background.paste(emoji_img, (x, emoji_y))  # 不使用透明度掩码
-                        
+                        self.paste_emoji(emoji_img, (x, emoji_y))
                         char_width = emoji_img.width
                     else:
                         # 如果获取图片失败，使用普通文本
@@ -1137,15 +1285,10 @@ class TextRenderer:
                     bbox = draw.textbbox((x, y), char, font=emoji_font)
                     draw.text((x, y), char, font=emoji_font, fill=fill)
                     char_width = bbox[2] - bbox[0]
-            else:
-                # 使用常规字体
-                bbox = draw.textbbox((x, y), char, font=font)
-                draw.text((x, y), char, font=font, fill=fill)
-                char_width = bbox[2] - bbox[0]
-            
-            x += char_width
-            total_width += char_width
-        
+
+                x += char_width
+                total_width += char_width
+
         return total_width
 
     def calculate_height(self, processed_lines: List[ProcessedLine]) -> int:
@@ -1165,11 +1308,11 @@ class TextRenderer:
             line_height = line.height * line.line_count
             
             # 代码块需要额外间距
-            if hasattr(line.style, 'is_code') and line.style.is_code:
+            if line.style.is_code:
                 line_height += 20  # 代码块上下各加10px的内边距
-            
+
             # 引用块需要额外间距
-            if hasattr(line.style, 'is_quote') and line.style.is_quote:
+            if line.style.is_quote:
                 line_height += 10  # 引用块上下各加5px的内边距
 
             # 签名的高度
@@ -1204,36 +1347,49 @@ class TextRenderer:
             emoji_font = self.font_manager.fonts['emoji_30']
             
             for line in lines:
-                _, height = self.measure_text(line, font, emoji_font)
+                line_width, height = self.measure_text(line, font, emoji_font)
                 processed_lines.append(ProcessedLine(
                     text=line,
                     style=segment.style,
                     height=height,
-                    line_count=1
+                    line_count=1,
+                    width=line_width
                 ))
             
             return processed_lines
 
         font = self.font_manager.get_font(segment.style)
         emoji_font = self.font_manager.fonts['emoji_30']
+
+        # 整段放得下时直接返回，跳过分词和换行决策
+        width, height = self.measure_text(segment.text, font, emoji_font)
+        if width <= available_width:
+            return [ProcessedLine(
+                text=segment.text,
+                style=segment.style,
+                height=height,
+                line_count=1,
+                width=width
+            )]
+
         words = []
         current_word = ''
         processed_lines = []
 
         # 分词处理
         for char in segment.text:
-            if emoji.is_emoji(char):
+            if _is_emoji(char):
                 if current_word:
                     words.append(current_word)
                     current_word = ''
                 words.append(char)  # emoji作为单独的词
-            elif char in [' ', '，', '。', '：', '、', '！', '？', '；']:
+            elif char in _SPLIT_CHARS:
                 if current_word:
                     words.append(current_word)
                 words.append(char)
                 current_word = ''
             else:
-                if ord(char) > 0x4e00:  # 中文字符
+                if _is_cjk(char):  # 中文等CJK字符逐字成词
                     if current_word:
                         words.append(current_word)
                         current_word = ''
@@ -1244,37 +1400,81 @@ class TextRenderer:
         if current_word:
             words.append(current_word)
 
-        current_line = ''
-        line_height = 0
-
+        # 一次性测量所有词的宽高，换行决策不再重复测量
+        word_widths = []
+        word_heights = []
         for word in words:
-            test_line = current_line + word
-            width, height = self.measure_text(test_line, font, emoji_font)
-            line_height = max(line_height, height)
+            width, height = self.measure_text(word, font, emoji_font)
+            word_widths.append(width)
+            word_heights.append(height)
 
-            if width <= available_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    processed_lines.append(ProcessedLine(
-                        text=current_line,
-                        style=segment.style,
-                        height=line_height,
-                        line_count=1
-                    ))
-                current_line = word
-
-        if current_line:
+        # 在预计算的词宽上做最优换行
+        for start, end in optimal_fit(word_widths, available_width):
             processed_lines.append(ProcessedLine(
-                text=current_line,
+                text=''.join(words[start:end]),
                 style=segment.style,
-                height=line_height,
-                line_count=1
+                height=max(word_heights[start:end]),
+                line_count=1,
+                width=sum(word_widths[start:end])
             ))
 
         return processed_lines
 
 
+def optimal_fit(widths: List[int], available_width: int) -> List[Tuple[int, int]]:
+    """
+    Knuth–Plass风格的最优换行：在预先测量好的词宽上做动态规划，
+    最小化各行（末行除外）剩余空隙的平方和
+
+    Args:
+        widths: 每个词的像素宽度
+        available_width: 行可用宽度
+
+    Returns:
+        List[Tuple[int, int]]: 每行对应的 (起始词下标, 结束词下标) 区间
+    """
+    n = len(widths)
+    if n == 0:
+        return []
+
+    # 前缀和，便于O(1)求任意区间宽度
+    offsets = [0] * (n + 1)
+    for i, w in enumerate(widths):
+        offsets[i + 1] = offsets[i] + w
+
+    infinity = float('inf')
+    minima = [0.0] + [infinity] * n
+    breaks = [0] * (n + 1)
+
+    for i in range(1, n + 1):
+        # 二分定位可行断点窗口：offsets[j] >= offsets[i] - available_width
+        # 即该行宽度不超过可用宽度的最早起点，免去逐个试探超宽断点
+        j_min = bisect.bisect_left(offsets, offsets[i] - available_width, 0, i)
+        if j_min >= i:
+            # 单个词本身超宽：独占一行，不计惩罚
+            if minima[i - 1] < minima[i]:
+                minima[i] = minima[i - 1]
+                breaks[i] = i - 1
+            continue
+        for j in range(j_min, i):
+            # 末行不计惩罚
+            badness = 0.0 if i == n else (available_width - (offsets[i] - offsets[j])) ** 2
+            cost = minima[j] + badness
+            if cost < minima[i]:
+                minima[i] = cost
+                breaks[i] = j
+
+    # 回溯断点得到各行区间
+    lines = []
+    i = n
+    while i > 0:
+        j = breaks[i]
+        lines.append((j, i))
+        i = j
+    lines.reverse()
+    return lines
+
+
 def compress_image(image_path: str, output_path: str, max_size: int = 3145728):  # 3MB in bytes
     """
     Compress an image to ensure it's under a certain file size.
@@ -1339,6 +1539,12 @@ def preprocess_text(input_text: str) -> Tuple[Optional[str], str]:
     return None, input_text
 
 
+@lru_cache(maxsize=128)
+def _parse_segments(text: str) -> Tuple[TextSegment, ...]:
+    """解析结果按输入文本缓存，同一文本重复渲染时跳过整个解析管线"""
+    return tuple(MarkdownParser().parse(text))
+
+
 def generate_image(text: str, output_path: str, title_image: Optional[str] = None):
     """生成图片主函数 - 修复彩色emoji渲染"""
     try:
@@ -1379,11 +1585,10 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
         # 获取主题颜色 - 在解析文本前获取，用于传递给TextStyle
         background_color, text_color, is_dark_theme = get_theme_colors()
         
-        # 初始化组件
-        font_manager = FontManager(font_paths)
+        # 初始化组件（FontManager按路径缓存复用）
+        font_manager = _font_manager_for(tuple(sorted(font_paths.items())))
         rect_width = width - 80
         max_content_width = rect_width - 80
-        parser = MarkdownParser()
         renderer = TextRenderer(font_manager, max_content_width)
 
         # 处理logo/title图片
@@ -1395,6 +1600,7 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
                     title_img = download_image_with_timeout(title_image)
                     if title_img is None:
                         print(f"无法下载logo图片: {title_image}")
+                        title_image = None  # 下载失败时放弃logo，后续不再重试
                         # 添加一个空行作为分隔
                         text = "\n\n" + text
                     else:
@@ -1410,8 +1616,8 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
                 # 添加一个空行作为分隔
                 text = "\n\n" + text
         
-        # 解析文本
-        segments = parser.parse(text)
+        # 解析文本（相同输入直接命中缓存）
+        segments = _parse_segments(text)
         # 设置主题信息
         for segment in segments:
             segment.style.is_dark_theme = is_dark_theme
@@ -1435,12 +1641,8 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
         title_height = 0
         if title_image:
             try:
-                if isinstance(title_image, str) and title_image.startswith(('http://', 'https://')):
-                    response = requests.get(title_image)
-                    response.raise_for_status()
-                    img = Image.open(BytesIO(response.content))
-                else:
-                    img = Image.open(title_image)
+                # URL已在上面下载并替换为本地临时文件，这里统一从磁盘读取
+                img = Image.open(title_image)
                 aspect_ratio = img.height / img.width
                 title_height = int((rect_width - 40) * aspect_ratio) + 40
             except Exception as e:
@@ -1459,7 +1661,12 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
 
         # 创建RGBA背景
         background = create_gradient_background(width, total_height)
-        draw = ImageDraw.Draw(background)
+        renderer.background = background  # 绑定画布，渲染器内部直接引用
+        # emoji统一绘制到透明overlay层，渲染结束后一次性合成
+        emoji_overlay = Image.new('RGBA', background.size, (0, 0, 0, 0))
+        renderer.emoji_overlay = emoji_overlay
+        # 整张卡片共用一个RGBA混合模式的Draw对象，避免各处重复构造
+        draw = ImageDraw.Draw(background, 'RGBA')
 
         if len(background_color) == 3:
             background_color = background_color + (128,)  # 添加alpha通道
@@ -1467,7 +1674,7 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
         # 创建卡片背景
         create_rounded_rectangle(
             background, rect_x, rect_y, rect_width, rect_height,
-            radius=30, bg_color=background_color
+            radius=30, bg_color=background_color, draw=draw
         )
 
         # 绘制内容
@@ -1475,44 +1682,39 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
         if title_image:
             current_y = add_title_image(background, title_image, rect_x, rect_y, rect_width)
 
-        # 逐字符绘制文本
+        # 逐字符绘制文本（循环不变量提到循环外）
+        base_x = rect_x + 40
+        emoji_font = font_manager.fonts['emoji_30']
+        # 预计算"后面是否还有内容"，空行分支不再反复扫描剩余行
+        has_content_after = [False] * (len(processed_lines) + 1)
+        for j in range(len(processed_lines) - 1, -1, -1):
+            has_content_after[j] = has_content_after[j + 1] or bool(processed_lines[j].text.strip())
         for i, line in enumerate(processed_lines):
             if not line.text.strip():
-                if i < len(processed_lines) - 1 and any(l.text.strip() for l in processed_lines[i + 1:]):
+                if has_content_after[i + 1]:
                     current_y += line.style.line_spacing
                 continue
 
-            # 计算文本起始位置
-            base_x = rect_x + 40
-            
             # 处理水平分割线
             if hasattr(line.style, 'is_horizontal_rule') and line.style.is_horizontal_rule:
                 # 绘制水平分割线
                 current_y += renderer.draw_horizontal_rule(draw, rect_x, current_y, rect_width, is_dark_theme)
                 continue
-            
-            # 处理对齐方式
-            if hasattr(line.style, 'alignment') and line.style.alignment == 'right':
-                # 右对齐：先计算文本宽度
-                font = font_manager.get_font(line.style)
-                text_width = 0
-                for char in line.text:
-                    if emoji.is_emoji(char):
-                        emoji_font = font_manager.fonts['emoji_30']
-                        bbox = draw.textbbox((0, 0), char, font=emoji_font)
-                    else:
-                        bbox = draw.textbbox((0, 0), char, font=font)
-                    text_width += bbox[2] - bbox[0]
+
+            # 每行解析一次字体，对齐和绘制共用
+            font = font_manager.get_font(line.style)
+
+            # 处理对齐方式，左对齐是绝大多数行，放在最快路径
+            if line.style.alignment != 'right':
+                x = base_x + line.style.indent
+            else:
+                # 右对齐：优先复用换行阶段算好的行宽，未测量时走缓存测量
+                text_width = line.width
+                if not text_width:
+                    text_width, _ = renderer.measure_text(line.text, font, emoji_font)
                 # 从右边计算起始x位置
                 x = rect_x + rect_width - 40 - text_width
-            else:
-                # 默认左对齐
-                x = base_x + line.style.indent
-            
-            # 设置字体和特殊样式
-            font = font_manager.get_font(line.style)
-            emoji_font = font_manager.fonts['emoji_30']
-            
+
             # 确保样式中包含theme信息
             line.style.is_dark_theme = is_dark_theme
             
@@ -1556,65 +1758,63 @@ def generate_image(text: str, output_path: str, title_image: Optional[str] = Non
                     draw, (content_x, current_y), content,
                     font, emoji_font, text_color, line.style
                 )
+            elif not _has_emoji(line.text):
+                # 无emoji的常规行：整行一次draw.text，免去逐字符循环
+                draw.text((x, current_y), line.text, font=font, fill=text_color)
             else:
-                # 常规文本逐字符渲染
+                # 含emoji的常规行：普通文本按run整段绘制，emoji逐个贴图
                 current_x = x
-                for char in line.text:
-                    if emoji.is_emoji(char):
+                for run, is_emo in _split_emoji_runs(line.text):
+                    if not is_emo:
+                        draw.text((current_x, current_y), run, font=font, fill=text_color)
+                        current_x += sum(renderer._char_metrics(c, font)[0] for c in run)
+                        continue
+                    for char in run:
                         # 使用Twemoji图片渲染emoji
                         emoji_size = line.style.font_size
                         emoji_img = get_local_emoji_image(char, size=emoji_size)
-                        
+
                         # 如果无法获取图片，尝试创建文本版emoji
                         if emoji_img is None:
                             emoji_img = create_text_emoji(char, size=emoji_size)
-                            
+
                         if emoji_img:
                             # 确保图像是RGBA模式
                             if emoji_img.mode != 'RGBA':
                                 emoji_img = emoji_img.convert('RGBA')
-                                
+
                             # 计算垂直居中位置
                             emoji_y = current_y + (emoji_size - emoji_img.height) // 2
-                            
-                            # 安全粘贴emoji图片
-                            try:
-                                background.paste(emoji_img, (current_x, emoji_y), emoji_img)
-                            except ValueError as e:
-                                print(f"粘贴emoji图片失败: {e}, 尝试不使用透明度掩码")
-                                background.paste(emoji_img, (current_x, emoji_y))  # 不使用透明度掩码
-                            
+                            renderer.paste_emoji(emoji_img, (current_x, emoji_y))
+
                             # 更新位置
                             current_x += emoji_img.width
                         else:
                             # 如果获取图片失败，使用普通文本
-                            emoji_font = font_manager.fonts['emoji_30']
                             bbox = draw.textbbox((current_x, current_y), char, font=emoji_font)
                             draw.text((current_x, current_y), char, font=emoji_font, fill=text_color)
                             current_x += bbox[2] - bbox[0]
-                    else:
-                        # 普通文字渲染
-                        font = font_manager.get_font(line.style)
-                        bbox = draw.textbbox((current_x, current_y), char, font=font)
-                        draw.text((current_x, current_y), char, font=font, fill=text_color)
-                        current_x += bbox[2] - bbox[0]
 
             if i < len(processed_lines) - 1:
                 current_y += line.height + line.style.line_spacing
             else:
                 current_y += line.height
 
-        # 直接保存为PNG，保持RGBA模式
+        # 一次性合成emoji overlay，替代逐个alpha粘贴
+        # 卡片最终完全不透明，合成后立即转回RGB，文字绘制和PNG编码都走三通道快速路径
+        if renderer.emoji_pasted:
+            background = Image.alpha_composite(background.convert('RGBA'), emoji_overlay).convert('RGB')
+
+        # 直接保存为PNG，compress_level=1在编码速度和文件体积间取平衡
         try:
-            # 测试RGBA模式保存
-            background.save(output_path, "PNG", optimize=False, compress_level=0)
-            print(f"已保存图片(RGBA): {output_path}")
+            background.save(output_path, "PNG", optimize=False, compress_level=1)
+            print(f"已保存图片({background.mode}): {output_path}")
         except Exception as e:
-            print(f"RGBA保存失败: {e}")
+            print(f"保存失败: {e}")
             try:
                 # 备用方案：转换为RGB模式再保存
                 background = background.convert('RGB')
-                background.save(output_path, "PNG", optimize=False, compress_level=0)
+                background.save(output_path, "PNG", optimize=False, compress_level=1)
                 print(f"已保存图片(RGB): {output_path}")
             except Exception as e2:
                 print(f"RGB保存也失败: {e2}")
@@ -1640,21 +1840,43 @@ def download_image_with_timeout(url: str, timeout: int = 10, max_retries: int =
     retry_count = 0
     while retry_count < max_retries:
         try:
-            response = requests.get(url, timeout=timeout, stream=True)
+            response = _http_session.get(url, timeout=timeout, stream=True,
+                                         headers=_DOWNLOAD_HEADERS)
             if response.status_code == 200:
                 try:
-                    return Image.open(BytesIO(response.content))  # 使用正确导入的BytesIO
+                    # 分块读入并限制总量，防止异常URL撑爆内存
+                    buf = io.BytesIO()
+                    total = 0
+                    for chunk in response.iter_content(64 * 1024):
+                        total += len(chunk)
+                        if total > _MAX_DOWNLOAD_BYTES:
+                            print(f"图像超过大小上限({_MAX_DOWNLOAD_BYTES}字节): {url}")
+                            return None
+                        buf.write(chunk)
+                    buf.seek(0)
+                    img = Image.open(buf)
+                    img.load()  # 在关闭响应前完成解码
+                    return img
                 except UnidentifiedImageError:
                     print(f"URL内容不是有效的图像: {url}")
                     return None
+                finally:
+                    response.close()
+            elif 400 <= response.status_code < 500:
+                # 客户端错误重试也不会成功，直接放弃
+                print(f"下载图像失败，状态码: {response.status_code}, URL: {url}")
+                return None
             else:
                 print(f"下载图像失败，状态码: {response.status_code}, URL: {url}")
                 retry_count += 1
-                time.sleep(1)  # 等待1秒后重试
         except (requests.RequestException, IOError) as e:
             print(f"下载图像出错: {e}, URL: {url}")
             retry_count += 1
-            time.sleep(1)  # 等待1秒后重试
-    
+
+        if retry_count < max_retries:
+            # 指数退避加随机抖动，瞬时故障快速恢复，持续故障逐步拉长间隔
+            delay = min(0.2 * (2 ** retry_count), 2.0) + random.uniform(0, 0.2)
+            time.sleep(delay)
+
     print(f"达到最大重试次数，无法下载图像: {url}")
     return None